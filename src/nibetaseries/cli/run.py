@@ -141,6 +141,11 @@ def get_parser():
                                 "for this BIDS dataset. "
                                 "If a value is passed and the file already exists, "
                                 "indexing is skipped.")
+    bids_opts.add_argument('--layout-backend', action='store', default='pybids',
+                           choices=['pybids', 'bids2table', 'rsbids'],
+                           help='backend used to index the BIDS dataset. '
+                                'bids2table and rsbids are considerably faster '
+                                'on large datasets, but must be installed separately.')
 
     # performance options
     g_perfm = parser.add_argument_group('Options to handle performance')
@@ -280,6 +285,7 @@ def main():
             task_label=opts.task_label,
             description_label=opts.description_label,
             work_dir=work_dir,
+            layout_backend=opts.layout_backend,
         )
 
         if opts.graph:
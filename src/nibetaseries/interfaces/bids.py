@@ -6,10 +6,44 @@ import os
 from shutil import copy
 from nipype.interfaces.base import (
     traits, isdefined, TraitedSpec, BaseInterfaceInputSpec,
-    File, SimpleInterface
+    File, InputMultiPath, OutputMultiPath, SimpleInterface
 )
 
 
+def _write_derivative(in_file, source_file, base_directory, out_path_base):
+    """derive the output path for a file and copy it there"""
+    import json
+    import os.path as op
+    import pkg_resources
+    from bids.layout import parse_file_entities
+    from bids.layout.writing import build_path
+
+    deriv_cfg = pkg_resources.resource_string("nibetaseries",
+                                              op.join("data", "derivatives.json"))
+    deriv_patterns = json.loads(deriv_cfg.decode('utf-8'))['fmriprep_path_patterns']
+
+    subject_entities = parse_file_entities(source_file)
+    betaseries_entities = parse_file_entities(in_file)
+    # hotfix
+    betaseries_entities['description'] = betaseries_entities['desc']
+
+    subject_entities.update(betaseries_entities)
+
+    out_file = build_path(subject_entities, deriv_patterns)
+
+    if not out_file:
+        raise ValueError("the provided entities do not make a valid file")
+
+    out_path = op.join(base_directory, out_path_base, out_file)
+
+    os.makedirs(op.dirname(out_path), exist_ok=True)
+
+    # copy the file to the output directory
+    copy(in_file, out_path)
+
+    return out_path
+
+
 class DerivativesDataSinkInputSpec(BaseInterfaceInputSpec):
     base_directory = traits.Directory(
         desc='Path to the base directory for storing data.')
@@ -34,39 +68,55 @@ class DerivativesDataSink(SimpleInterface):
             self.out_path_base = out_path_base
 
     def _run_interface(self, runtime):
-        import json
-        import os.path as op
-        import pkg_resources
-        from bids.layout import parse_file_entities
-        from bids.layout.writing import build_path
+        base_directory = runtime.cwd
+        if isdefined(self.inputs.base_directory):
+            base_directory = os.path.abspath(self.inputs.base_directory)
 
-        deriv_cfg = pkg_resources.resource_string("nibetaseries",
-                                                  op.join("data", "derivatives.json"))
-        deriv_patterns = json.loads(deriv_cfg.decode('utf-8'))['fmriprep_path_patterns']
+        self._results['out_file'] = _write_derivative(self.inputs.in_file,
+                                                      self.inputs.source_file,
+                                                      base_directory,
+                                                      self.out_path_base)
 
-        subject_entities = parse_file_entities(self.inputs.source_file)
-        betaseries_entities = parse_file_entities(self.inputs.in_file)
-        # hotfix
-        betaseries_entities['description'] = betaseries_entities['desc']
+        return runtime
 
-        subject_entities.update(betaseries_entities)
 
-        out_file = build_path(subject_entities, deriv_patterns)
+class BulkDerivativesDataSinkInputSpec(BaseInterfaceInputSpec):
+    base_directory = traits.Directory(
+        desc='Path to the base directory for storing data.')
+    in_files = InputMultiPath(File(exists=True), mandatory=True)
+    source_file = File(exists=False, mandatory=True, desc='the input func file')
 
-        if not out_file:
-            raise ValueError("the provided entities do not make a valid file")
 
-        base_directory = runtime.cwd
-        if isdefined(self.inputs.base_directory):
-            base_directory = os.path.abspath(self.inputs.base_directory)
+class BulkDerivativesDataSinkOutputSpec(TraitedSpec):
+    out_files = OutputMultiPath(File(exists=True), desc='written file paths')
 
-        out_path = op.join(base_directory, self.out_path_base, out_file)
 
-        os.makedirs(op.dirname(out_path), exist_ok=True)
+class BulkDerivativesDataSink(SimpleInterface):
+    """
+    Write a whole list of derivatives in one process, instead of paying
+    the MapNode dispatch overhead of one subprocess per file.
+    """
+    input_spec = BulkDerivativesDataSinkInputSpec
+    output_spec = BulkDerivativesDataSinkOutputSpec
+    out_path_base = "nibetaseries"
+    _always_run = True
 
-        # copy the file to the output directory
-        copy(self.inputs.in_file, out_path)
+    def __init__(self, out_path_base=None, **inputs):
+        super(BulkDerivativesDataSink, self).__init__(**inputs)
+        self._results['out_files'] = []
+        if out_path_base:
+            self.out_path_base = out_path_base
+
+    def _run_interface(self, runtime):
+        base_directory = runtime.cwd
+        if isdefined(self.inputs.base_directory):
+            base_directory = os.path.abspath(self.inputs.base_directory)
 
-        self._results['out_file'] = out_path
+        self._results['out_files'] = [
+            _write_derivative(in_file,
+                              self.inputs.source_file,
+                              base_directory,
+                              self.out_path_base)
+            for in_file in self.inputs.in_files]
 
         return runtime
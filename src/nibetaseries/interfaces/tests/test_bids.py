@@ -2,7 +2,7 @@
 import os
 import pytest
 
-from ..bids import DerivativesDataSink
+from ..bids import DerivativesDataSink, BulkDerivativesDataSink
 
 
 @pytest.fixture(scope='session')
@@ -87,3 +87,26 @@ def test_derivatives_data_sink_bs(base_dir, betaseries_file, bs_out, preproc_fil
     res = dds.run()
 
     assert res.outputs.out_file == expected_out
+
+
+def test_bulk_derivatives_data_sink(base_dir, betaseries_file, corr_csv,
+                                    corr_fig, preproc_file):
+
+    # the expected outputs, written in one process
+    out_dir = os.path.join(str(base_dir), 'nibetaseries', 'sub-01', 'ses-pre', 'func')
+    expected_out = [
+        os.path.join(out_dir,
+                     ('sub-01_ses-pre_task-waffles_run-1_space-MNI152NLin2009cAsym'
+                      '_desc-condTest_correlation.tsv')),
+        os.path.join(out_dir,
+                     ('sub-01_ses-pre_task-waffles_run-1_space-MNI152NLin2009cAsym'
+                      '_desc-condTest_correlation.svg')),
+    ]
+
+    # create and run instance of the interface
+    dds = BulkDerivativesDataSink(base_directory=str(base_dir),
+                                  in_files=[str(corr_csv), str(corr_fig)],
+                                  source_file=str(preproc_file))
+    res = dds.run()
+
+    assert list(res.outputs.out_files) == expected_out
@@ -6,35 +6,77 @@
 NiBetaSeries processing workflows
 """
 from __future__ import print_function, division, absolute_import, unicode_literals
+import json
 import os
-from copy import deepcopy
+import re
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
 
 from bids import BIDSLayout
+from nipype import config as ncfg
 from nipype.pipeline import engine as pe
 from nipype.interfaces import utility as niu
 from niworkflows.engine.workflows import LiterateWorkflow as Workflow
 
-from bids import __version__ as pybids_ver
-from numpy import __version__ as numpy_ver
-from pandas import __version__ as pandas_ver
-from nipype import __version__ as nipype_ver
-from nibabel import __version__ as nibabel_ver
-from niworkflows import __version__ as niworkflows_ver
-
 from .._version import get_versions
-from .utils import collect_data
+from .utils import cached_collect_data_bulk, BIDS2TableLayout
 from .model import init_betaseries_wf
 from .analysis import init_correlation_wf
-from ..interfaces.bids import DerivativesDataSink
+from ..interfaces.bids import BulkDerivativesDataSink
 from ..interfaces.nilearn import CensorVolumes
 
 
+def _dist_version(dist_name):
+    """read a distribution's version from its metadata without importing it"""
+    try:
+        from importlib.metadata import version
+    except ImportError:  # python < 3.8
+        from pkg_resources import get_distribution
+        return get_distribution(dist_name).version
+    return version(dist_name)
+
+
+# formatted once at import; the boilerplate only depends on installed versions
+_BOILERPLATE_DESC = """
+Results included in this manuscript come from modeling
+performed using *NiBetaSeries* {nibs_ver} [@Kent2018],
+which is based on *Nipype* {nipype_ver} [@Gorgolewski2011; @Gorgolewski2018].
+""".format(nibs_ver=get_versions()['version'],
+           nipype_ver=_dist_version('nipype'))
+
+_BOILERPLATE_POSTDESC = """
+
+### Software Dependencies
+
+Additional libraries used in the NiBetaSeries workflow include
+*Pybids* {pybids_ver} [@Yarkoni2019], *Niworkflows* {niworkflows_ver},
+*Nibabel* {nibabel_ver}, *Pandas* {pandas_ver} [@McKinney2010], and
+*Numpy* {numpy_ver} [@VanDerWalt2011; @Oliphant2006].
+
+### Copyright Waiver
+The above boilerplate text was automatically generated by NiBetaSeries
+with the express intention that users should copy and paste this
+text into their manuscripts *unchanged*.
+It is released under the [CC0]\
+(https://creativecommons.org/publicdomain/zero/1.0/) license.
+
+### References
+""".format(pybids_ver=_dist_version('pybids'),
+           niworkflows_ver=_dist_version('niworkflows'),
+           nibabel_ver=_dist_version('nibabel'),
+           pandas_ver=_dist_version('pandas'),
+           numpy_ver=_dist_version('numpy'))
+
+
 def init_nibetaseries_participant_wf(
     estimator, atlas_img, atlas_lut, bids_dir,
     database_path, derivatives_pipeline_dir, exclude_description_label,
     fir_delays, hrf_model, high_pass, norm_betas, output_dir, return_residuals,
     run_label, selected_confounds, session_label, signal_scaling, smoothing_kernel,
     space_label, subject_list, task_label, description_label, work_dir,
+    layout_backend='pybids',
         ):
 
     """
@@ -90,104 +132,375 @@ def init_nibetaseries_participant_wf(
             Include bold series containing this description label
         work_dir : str
             Directory in which to store workflow execution state and temporary files
+        layout_backend : str
+            Backend used to index the BIDS dataset, either ``pybids`` (default),
+            ``bids2table``, or ``rsbids``
     """
     # setup workflow
     nibetaseries_participant_wf = Workflow(name='nibetaseries_participant_wf')
-    nibetaseries_participant_wf.base_dir = os.path.join(work_dir, 'NiBetaSeries_work')
-    os.makedirs(nibetaseries_participant_wf.base_dir, exist_ok=True)
+    base_dir = Path(work_dir) / 'NiBetaSeries_work'
+    nibetaseries_participant_wf.base_dir = str(base_dir)
+    try:
+        base_dir.mkdir(parents=True)
+    except FileExistsError:
+        pass
+
+    nibetaseries_participant_wf.__desc__ = _BOILERPLATE_DESC
+    nibetaseries_participant_wf.__postdesc__ = _BOILERPLATE_POSTDESC
+
+    if layout_backend == 'bids2table':
+        layout = _init_bids2table_layout(bids_dir, derivatives_pipeline_dir, work_dir)
+    elif layout_backend == 'rsbids':
+        try:
+            from rsbids.pybids import BIDSLayout as RsBIDSLayout
+        except ImportError:
+            raise ImportError("layout_backend='rsbids' requires the rsbids package, "
+                              "which is not distributed on PyPI and must be "
+                              "installed from its source repository")
+        layout = RsBIDSLayout(bids_dir, derivatives=derivatives_pipeline_dir)
+    else:
+        # persist the layout database across subjects and re-runs so only
+        # the first invocation pays for the filesystem walk
+        user_database = database_path is not None
+        if database_path is None:
+            database_path = os.path.join(work_dir, 'dbcache')
+        reset_database = (not os.path.exists(database_path)
+                          or _layout_db_is_stale(database_path, bids_dir,
+                                                 derivatives_pipeline_dir,
+                                                 subject_list,
+                                                 trust_missing_meta=user_database))
+
+        # when building a fresh index, skip the subject directories that
+        # were not requested; the walk time scales with what is indexed
+        layout_kwargs = {}
+        if reset_database and subject_list:
+            layout_kwargs['ignore'] = _scoped_ignore_patterns(subject_list, bids_dir)
+
+        # reading in derivatives and bids inputs as queryable database like objects
+        layout = BIDSLayout(bids_dir,
+                            derivatives=derivatives_pipeline_dir,
+                            index_metadata=True,
+                            database_path=database_path,
+                            reset_database=reset_database,
+                            **layout_kwargs)
+
+        if reset_database:
+            # record the inputs the database was built from so the next
+            # run can tell whether it is still fresh
+            with open(_layout_db_meta_file(database_path), 'w') as meta:
+                json.dump(_layout_db_inputs(bids_dir, derivatives_pipeline_dir,
+                                            subject_list), meta)
+
+            _tune_layout_db(database_path)
+
+    # the pybids database file doubles as a cache-invalidation key; the
+    # other backends keep their index in memory, so skip the disk cache
+    database_mtime = None
+    if layout_backend == 'pybids':
+        database_mtime = _layout_db_mtime(database_path)
+
+    # one set of layout queries for the whole cohort instead of one per
+    # subject, re-read from disk on resumes while the database is unchanged
+    bulk_data = cached_collect_data_bulk(
+        layout,
+        subject_list,
+        cache_dir=(os.path.join(work_dir, 'collect_data_cache')
+                   if database_mtime is not None else None),
+        database_mtime=database_mtime,
+        task=task_label,
+        run=run_label,
+        ses=session_label,
+        space=space_label,
+        description=description_label)
+
+    # workflow construction is independent across subjects, so several
+    # subjects can be built in parallel worker processes
+    parallel_build = len(subject_list) > 1
+    build_single_subject = partial(
+        _build_single_subject_wf,
+        # composed once; each subject only appends its own components
+        crash_base=Path(output_dir) / 'nibetaseries',
+        # under the spawn start method workers do not inherit the nipype
+        # config set by the CLI, so hand them this process's settings
+        execution_config=dict(ncfg._sections.get('execution', {})),
+        wf_kwargs=dict(estimator=estimator,
+                       atlas_img=atlas_img,
+                       atlas_lut=atlas_lut,
+                       fir_delays=fir_delays,
+                       hrf_model=hrf_model,
+                       high_pass=high_pass,
+                       norm_betas=norm_betas,
+                       output_dir=output_dir,
+                       return_residuals=return_residuals,
+                       selected_confounds=selected_confounds,
+                       signal_scaling=signal_scaling,
+                       smoothing_kernel=smoothing_kernel))
+
+    subject_data_list = [bulk_data[str(subject_label)]
+                         for subject_label in subject_list]
+
+    if parallel_build:
+        # workers spill each built workflow to disk and hand back only its
+        # path; the parent streams them into the graph one at a time, so
+        # peak memory holds the graph plus a single in-flight workflow
+        # rather than every subject workflow at once
+        spill_dir = base_dir / 'subject_wfs'
+        try:
+            spill_dir.mkdir(parents=True)
+        except FileExistsError:
+            pass
+
+        max_workers = min(len(subject_list), os.cpu_count())
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(build_single_subject, subject_label,
+                                   subject_data, spill_dir=str(spill_dir))
+                       for subject_label, subject_data
+                       in zip(subject_list, subject_data_list)]
+            # consume in submission order: memory behaves the same (one
+            # spilled workflow in flight) and node order stays stable
+            # across runs, keeping working directories resumable
+            for future in futures:
+                wf_file = future.result()
+                with open(wf_file, 'rb') as spilled:
+                    single_subject_wf = pickle.load(spilled)
+                os.remove(wf_file)
+                nibetaseries_participant_wf.add_nodes([single_subject_wf])
+    else:
+        for subject_label, subject_data in zip(subject_list, subject_data_list):
+            nibetaseries_participant_wf.add_nodes(
+                [build_single_subject(subject_label, subject_data)])
 
-    nibetaseries_participant_wf.__desc__ = """
-Results included in this manuscript come from modeling
-performed using *NiBetaSeries* {nibs_ver} [@Kent2018],
-which is based on *Nipype* {nipype_ver} [@Gorgolewski2011; @Gorgolewski2018].
-""".format(nibs_ver=get_versions()['version'],
-           nipype_ver=nipype_ver)
+    return nibetaseries_participant_wf
 
-    nibetaseries_participant_wf.__postdesc__ = """
 
-### Software Dependencies
+def _build_single_subject_wf(subject_label, subject_data, wf_kwargs, crash_base,
+                             execution_config=None, spill_dir=None):
+    """
+    Build the workflow for a single subject, possibly in a worker process.
+    ``subject_data`` holds this subject's slice of the bulk layout query,
+    so workers need no layout access of their own. ``execution_config``
+    carries the parent's nipype execution settings, which spawn-started
+    workers would otherwise replace with nipype's defaults. When
+    ``spill_dir`` is set the workflow is pickled there and only its path
+    is returned.
+    """
+    # files associated with each preproc, already grouped by modality
+    brainmask_list = subject_data['brainmask']
+    confound_tsv_list = subject_data['confounds']
+    events_tsv_list = subject_data['events']
+    preproc_img_list = subject_data['preproc']
+    bold_metadata_list = subject_data['metadata']
+
+    single_subject_wf = init_single_subject_wf(
+        bold_metadata_list=bold_metadata_list,
+        brainmask_list=brainmask_list,
+        confound_tsv_list=confound_tsv_list,
+        events_tsv_list=events_tsv_list,
+        name='single_subject' + subject_label + '_wf',
+        preproc_img_list=preproc_img_list,
+        **wf_kwargs)
+
+    # the workflow snapshots this process's nipype config at construction;
+    # re-apply the parent's execution settings before the nodes pick up a
+    # shared reference to it
+    if execution_config:
+        single_subject_wf.config['execution'].update(execution_config)
+
+    # add nibetaseries to the output directory because of DerivativesDataSink class
+    single_subject_wf.config['execution']['crashdump_dir'] = (
+        str(crash_base / ('sub-' + subject_label) / 'log')
+    )
+
+    # the config is never mutated per-node in this workflow, so every node
+    # can share one reference instead of paying for a recursive copy each
+    shared_config = single_subject_wf.config
+    for node in single_subject_wf._get_all_nodes():
+        node.config = shared_config
+
+    if spill_dir is not None:
+        wf_file = os.path.join(spill_dir, 'sub-' + subject_label + '.pkl')
+        with open(wf_file, 'wb') as spilled:
+            pickle.dump(single_subject_wf, spilled, pickle.HIGHEST_PROTOCOL)
+        return wf_file
+
+    return single_subject_wf
+
+
+def _layout_db_meta_file(database_path):
+    """path of the sidecar json recording the database's input mtimes"""
+    return os.path.normpath(database_path) + '.meta.json'
+
+
+def _layout_db_inputs(bids_dir, derivatives_pipeline_dir, subject_list):
+    return {'bids_dir': os.path.getmtime(bids_dir),
+            'derivatives_pipeline_dir': os.path.getmtime(derivatives_pipeline_dir),
+            'subjects': sorted(subject_list) if subject_list else None}
+
+
+def _layout_db_is_stale(database_path, bids_dir, derivatives_pipeline_dir,
+                        subject_list, trust_missing_meta):
+    """
+    Check whether the input directories (or the subject scope the index
+    was restricted to) changed since the layout database was built. A
+    database without a sidecar is only trusted when the user passed it in
+    explicitly (``trust_missing_meta``); at the default work_dir location
+    the sidecar is written after indexing finishes, so its absence means
+    a previous run was interrupted and left a partial database behind.
+    """
+    meta_file = _layout_db_meta_file(database_path)
+    if not os.path.exists(meta_file):
+        return not trust_missing_meta
+
+    try:
+        with open(meta_file, 'r') as meta:
+            recorded = json.load(meta)
+    except ValueError:
+        # a truncated sidecar (e.g. an interrupted write) means stale
+        return True
 
-Additional libraries used in the NiBetaSeries workflow include
-*Pybids* {pybids_ver} [@Yarkoni2019], *Niworkflows* {niworkflows_ver},
-*Nibabel* {nibabel_ver}, *Pandas* {pandas_ver} [@McKinney2010], and
-*Numpy* {numpy_ver} [@VanDerWalt2011; @Oliphant2006].
+    return recorded != _layout_db_inputs(bids_dir,
+                                         derivatives_pipeline_dir,
+                                         subject_list)
 
-### Copyright Waiver
-The above boilerplate text was automatically generated by NiBetaSeries
-with the express intention that users should copy and paste this
-text into their manuscripts *unchanged*.
-It is released under the [CC0]\
-(https://creativecommons.org/publicdomain/zero/1.0/) license.
 
-### References
-""".format(pybids_ver=pybids_ver,
-           niworkflows_ver=niworkflows_ver,
-           nibabel_ver=nibabel_ver,
-           pandas_ver=pandas_ver,
-           numpy_ver=numpy_ver)
-
-    # Go ahead and initialize the layout database
-    if database_path is None:
-        database_path = os.path.join(work_dir, 'dbcache')
-        reset_database = True
+def _layout_db_mtime(database_path):
+    """
+    mtime of the layout database's sqlite file. Only that file is
+    snapshotted: the -wal/-shm sidecars and any nested derivative-layout
+    database are touched on every open, which would change the cache key
+    on every run.
+    """
+    from glob import glob
+
+    if os.path.isdir(database_path):
+        candidates = sorted(glob(os.path.join(database_path, '*.sqlite')))
+        if candidates:
+            return os.path.getmtime(candidates[0])
+    return os.path.getmtime(database_path)
+
+
+def _scoped_ignore_patterns(subject_list, root):
+    """
+    Ignore patterns that skip non-requested subject directories during
+    indexing, while keeping pybids' standard ignores (which are replaced
+    wholesale when ``ignore`` is overridden). The standard directories
+    are given as plain strings, which every supported pybids version
+    resolves against the dataset root itself; regexes are matched against
+    absolute paths before pybids 0.14 and root-relative ``/``-prefixed
+    paths afterwards, so the hidden-file pattern is version-dependent and
+    the subject pattern is left unanchored to work with both.
+    """
+    try:
+        pybids_version = tuple(
+            int(part) for part in _dist_version('pybids').split('.')[:2])
+    except ValueError:
+        pybids_version = (0, 14)
+
+    if pybids_version >= (0, 14):
+        hidden = re.compile(r'/\.')
     else:
-        reset_database = False
-
-    # reading in derivatives and bids inputs as queryable database like objects
-    layout = BIDSLayout(bids_dir,
-                        derivatives=derivatives_pipeline_dir,
-                        index_metadata=True,
-                        database_path=database_path,
-                        reset_database=reset_database)
-
-    for subject_label in subject_list:
-        # collect the necessary inputs for both collect data
-        subject_data = collect_data(layout,
-                                    subject_label,
-                                    task=task_label,
-                                    run=run_label,
-                                    ses=session_label,
-                                    space=space_label,
-                                    description=description_label)
-        # collect files to be associated with each preproc
-        brainmask_list = [d['brainmask'] for d in subject_data]
-        confound_tsv_list = [d['confounds'] for d in subject_data]
-        events_tsv_list = [d['events'] for d in subject_data]
-        preproc_img_list = [d['preproc'] for d in subject_data]
-        bold_metadata_list = [d['metadata'] for d in subject_data]
-
-        single_subject_wf = init_single_subject_wf(
-            estimator=estimator,
-            atlas_img=atlas_img,
-            atlas_lut=atlas_lut,
-            bold_metadata_list=bold_metadata_list,
-            brainmask_list=brainmask_list,
-            confound_tsv_list=confound_tsv_list,
-            events_tsv_list=events_tsv_list,
-            fir_delays=fir_delays,
-            hrf_model=hrf_model,
-            high_pass=high_pass,
-            name='single_subject' + subject_label + '_wf',
-            norm_betas=norm_betas,
-            output_dir=output_dir,
-            preproc_img_list=preproc_img_list,
-            return_residuals=return_residuals,
-            selected_confounds=selected_confounds,
-            signal_scaling=signal_scaling,
-            smoothing_kernel=smoothing_kernel,
-        )
-
-        # add nibetaseries to the output directory because of DerivativesDataSink class
-        single_subject_wf.config['execution']['crashdump_dir'] = (
-            os.path.join(output_dir, "nibetaseries", "sub-" + subject_label, 'log')
-        )
-
-        for node in single_subject_wf._get_all_nodes():
-            node.config = deepcopy(single_subject_wf.config)
-
-        nibetaseries_participant_wf.add_nodes([single_subject_wf])
+        # against absolute paths, a bare /\. would ignore the whole
+        # dataset whenever an ancestor directory is dotted
+        hidden = re.compile('^' + re.escape(os.path.abspath(root)) + r'(/.*)?/\.')
 
-    return nibetaseries_participant_wf
+    labels = '|'.join(re.escape(label) for label in subject_list)
+    return [
+        'code', 'models', 'sourcedata', 'stimuli', 'derivatives',
+        hidden,
+        # any subject directory or file outside the requested list
+        re.compile(r'/sub-(?!(?:{labels})(?:[/_.]|$))'.format(labels=labels)),
+    ]
+
+
+def _tune_layout_db(database_path):
+    """
+    Index the tags columns hit by the repeated ``layout.get(...)`` calls
+    in ``collect_data``; pybids maps the tag value column as ``_value``,
+    and ``files.path`` is already the primary key. WAL journaling is the
+    only pragma worth setting here, being the only one that persists
+    beyond this connection. Runs once when the databases are (re)built;
+    pybids keeps a second database for each derivative pipeline in a
+    nested directory, so every ``.sqlite`` file under the path is tuned.
+    """
+    import logging
+    import sqlite3
+    from glob import glob
+
+    if os.path.isdir(database_path):
+        db_files = glob(os.path.join(database_path, '**', '*.sqlite'),
+                        recursive=True)
+    else:
+        db_files = [database_path]
+
+    for db_file in db_files:
+        try:
+            conn = sqlite3.connect(db_file)
+            with conn:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_tags_entity_value '
+                             'ON tags (entity_name, _value)')
+            conn.close()
+        except sqlite3.Error:
+            # an unindexed database is still correct, just slower
+            logging.warning('could not index the layout database %s',
+                            db_file, exc_info=True)
+
+
+def _init_bids2table_layout(bids_dir, derivatives_pipeline_dir, work_dir):
+    """
+    Index the dataset with bids2table (Arrow/Parquet backed) and wrap the
+    result so it can be queried like a ``BIDSLayout`` by ``collect_data``.
+    A derivatives directory outside ``bids_dir`` is indexed separately and
+    merged into the same layout. The indexes are persisted under
+    ``work_dir`` and only rebuilt when the input directories change.
+    """
+    import pandas as pd
+
+    try:
+        from bids2table import bids2table
+    except ImportError:
+        # the 2.x line dropped this entry point along with the BIDSTable
+        # accessors the adapter relies on
+        raise ImportError("layout_backend='bids2table' requires bids2table 0.1 "
+                          "(pip install 'bids2table~=0.1.0')")
+
+    meta_file = os.path.join(work_dir, 'index.parquet.meta.json')
+    dir_mtimes = {'bids_dir': os.path.getmtime(bids_dir),
+                  'derivatives_pipeline_dir': os.path.getmtime(derivatives_pipeline_dir)}
+
+    # a derivatives tree under bids_dir is picked up by the main walk;
+    # anything else needs its own index or no preprocs would ever be found
+    roots = [(bids_dir, os.path.join(work_dir, 'index.parquet'))]
+    deriv_root = os.path.abspath(derivatives_pipeline_dir)
+    if not (deriv_root + os.sep).startswith(os.path.abspath(bids_dir) + os.sep):
+        roots.append((derivatives_pipeline_dir,
+                      os.path.join(work_dir, 'index_derivatives.parquet')))
+
+    # only re-index when the input directories changed since the last run
+    overwrite = True
+    if os.path.exists(meta_file) and all(os.path.exists(path) for _, path in roots):
+        try:
+            with open(meta_file, 'r') as meta:
+                overwrite = json.load(meta) != dir_mtimes
+        except ValueError:
+            pass
+
+    frames = []
+    for root, index_path in roots:
+        table = bids2table(root,
+                           persistent=True,
+                           index_path=index_path,
+                           workers=os.cpu_count(),
+                           overwrite=overwrite)
+        frames.append(BIDS2TableLayout.from_bids2table(
+            table, derivatives_dir=derivatives_pipeline_dir).frame)
+
+    with open(meta_file, 'w') as meta:
+        json.dump(dir_mtimes, meta)
+
+    if len(frames) == 1:
+        return BIDS2TableLayout(frames[0])
+    return BIDS2TableLayout(pd.concat(frames, ignore_index=True))
 
 
 def init_single_subject_wf(
@@ -328,17 +641,16 @@ def init_single_subject_wf(
     correlation_wf = init_correlation_wf()
 
     # correlation matrix datasink
-    ds_correlation_matrix = pe.MapNode(DerivativesDataSink(base_directory=output_dir),
-                                       iterfield=['in_file'],
-                                       name='ds_correlation_matrix')
+    # single nodes writing all files at once: the copies are cheap and a
+    # MapNode would fork one subprocess per file
+    ds_correlation_matrix = pe.Node(BulkDerivativesDataSink(base_directory=output_dir),
+                                    name='ds_correlation_matrix')
 
-    ds_correlation_fig = pe.MapNode(DerivativesDataSink(base_directory=output_dir),
-                                    iterfield=['in_file'],
-                                    name='ds_correlation_fig')
+    ds_correlation_fig = pe.Node(BulkDerivativesDataSink(base_directory=output_dir),
+                                 name='ds_correlation_fig')
 
-    ds_betaseries_file = pe.MapNode(DerivativesDataSink(base_directory=output_dir),
-                                    iterfield=['in_file'],
-                                    name='ds_betaseries_file')
+    ds_betaseries_file = pe.Node(BulkDerivativesDataSink(base_directory=output_dir),
+                                 name='ds_betaseries_file')
 
     # connect the nodes for the beta series workflow
     workflow.connect([
@@ -351,7 +663,7 @@ def init_single_subject_wf(
         (betaseries_wf, output_node,
             [('output_node.betaseries_files', 'betaseries_file')]),
         (input_node, ds_betaseries_file, [('preproc_img', 'source_file')]),
-        (output_node, ds_betaseries_file, [('betaseries_file', 'in_file')]),
+        (output_node, ds_betaseries_file, [('betaseries_file', 'in_files')]),
     ])
 
     if atlas_img and atlas_lut:
@@ -384,21 +696,20 @@ def init_single_subject_wf(
                 [('output_node.correlation_matrix', 'correlation_matrix'),
                  ('output_node.correlation_fig', 'correlation_fig')]),
             (input_node, ds_correlation_matrix, [('preproc_img', 'source_file')]),
-            (output_node, ds_correlation_matrix, [('correlation_matrix', 'in_file')]),
+            (output_node, ds_correlation_matrix, [('correlation_matrix', 'in_files')]),
             (input_node, ds_correlation_fig, [('preproc_img', 'source_file')]),
-            (output_node, ds_correlation_fig, [('correlation_fig', 'in_file')]),
+            (output_node, ds_correlation_fig, [('correlation_fig', 'in_files')]),
         ])
 
     if return_residuals:
-        ds_residual_file = pe.MapNode(DerivativesDataSink(base_directory=output_dir),
-                                      iterfield=['in_file'],
-                                      name='ds_residual_file')
+        ds_residual_file = pe.Node(BulkDerivativesDataSink(base_directory=output_dir),
+                                   name='ds_residual_file')
 
         workflow.connect([
             (betaseries_wf, output_node,
                 [('output_node.residual_file', 'residual_file')]),
             (output_node, ds_residual_file,
-                [('residual_file', 'in_file')]),
+                [('residual_file', 'in_files')]),
             (input_node, ds_residual_file,
                 [('preproc_img', 'source_file')]),
         ])
@@ -410,15 +721,30 @@ def _check_bs_len(beta_series_list):
     """make sure each beta series at least 3 betas"""
     import logging
     import re
+    from concurrent.futures import ThreadPoolExecutor
 
     import nibabel as nib
 
     min_size = 3
 
-    def check_beta_series(beta_series, min_size):
-        size = nib.load(beta_series).shape[-1]
+    # compiled once here (not at module scope) since this function runs as
+    # a nipype Function node without access to module globals; searching an
+    # anchored pattern also skips the leading-wildcard match of re.match
+    trial_type_re = re.compile(r"desc-(?P<trial_type>[0-9A-Za-z]+)_")
+
+    def get_len(beta_series):
+        # only the 4th dimension is needed, so read just the header and
+        # leave the image data unloaded (and for .nii.gz, undecompressed)
+        return nib.load(beta_series).header.get_data_shape()[-1]
+
+    # the reads are independent, so overlap the I/O latency
+    max_workers = min(8, max(len(beta_series_list), 1))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        sizes = list(pool.map(get_len, beta_series_list))
+
+    def check_beta_series(beta_series, size, min_size):
         if size < min_size:
-            mtch = re.match(".*desc-(?P<trial_type>[0-9A-Za-z]+)_.*", beta_series)
+            mtch = trial_type_re.search(beta_series)
             if mtch:
                 trial_type = mtch.groupdict().get('trial_type')
             else:
@@ -434,8 +760,8 @@ def _check_bs_len(beta_series_list):
             return False
         return True
 
-    beta_series_list[:] = [bs for bs in beta_series_list
-                           if check_beta_series(bs, min_size=min_size)]
+    beta_series_list = list(bs for bs, size in zip(beta_series_list, sizes)
+                            if check_beta_series(bs, size, min_size=min_size))
     if not beta_series_list:
         msg = "None of the beta series have at least {num} betas.".format(num=min_size)
         raise RuntimeError(msg)
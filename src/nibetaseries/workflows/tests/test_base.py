@@ -5,7 +5,8 @@ import nibabel as nib
 import numpy as np
 import pytest
 
-from ..base import init_nibetaseries_participant_wf, _check_bs_len
+from ..base import (init_nibetaseries_participant_wf, _check_bs_len,
+                    _scoped_ignore_patterns)
 
 
 @pytest.mark.parametrize(
@@ -138,3 +139,22 @@ def test_check_bs_len(fnames, lengths, expected_out, tmp_path):
         assert "None of the beta series" in str(rterr.value)
     else:
         assert [op.basename(f) for f in _check_bs_len(fpaths)] == expected_out
+
+
+def test_scoped_ignore_patterns():
+    patterns = _scoped_ignore_patterns(['01', '10'], '/data/bids')
+    subject_scope = patterns[-1]
+
+    # the standard pybids ignores stay in place as root-resolved strings
+    for standard in ('code', 'models', 'sourcedata', 'stimuli', 'derivatives'):
+        assert standard in patterns
+
+    # requested subjects are kept
+    assert not subject_scope.search('/sub-01/func')
+    assert not subject_scope.search('/sub-10')
+    # everything else is skipped, including label prefixes
+    assert subject_scope.search('/sub-02/func')
+    assert subject_scope.search('/sub-011')
+    # the same pattern works against absolute paths (pybids < 0.14)
+    assert subject_scope.search('/data/bids/sub-02/func')
+    assert not subject_scope.search('/data/bids/sub-01/func')
@@ -1,9 +1,11 @@
 import json
 
 from bids import BIDSLayout
+import pandas as pd
 import pytest
 
-from ..utils import collect_data, _exec_query
+from ..utils import (collect_data, collect_data_bulk, cached_collect_data_bulk,
+                     subject_data_records, _exec_query, BIDS2TableLayout)
 
 
 @pytest.fixture(scope='session')
@@ -26,11 +28,11 @@ def test_collect_data(bids_layout, sub_metadata, preproc_file,
         metadata = json.load(sm)
 
     expected_out = {
-            'brainmask': str(brainmask_file),
-            'confounds': str(confounds_file),
-            'events': str(sub_events),
-            'preproc': str(preproc_file),
-            'metadata': metadata
+            'brainmask': [str(brainmask_file)],
+            'confounds': [str(confounds_file)],
+            'events': [str(sub_events)],
+            'preproc': [str(preproc_file)],
+            'metadata': [metadata]
         }
 
     subject_label = '01'
@@ -41,10 +43,110 @@ def test_collect_data(bids_layout, sub_metadata, preproc_file,
     desc = 'preproc'
     subject_data = collect_data(bids_layout, subject_label, ses=session,
                                 task=task, run=run, space=space,
-                                description=desc)[0]
+                                description=desc)
 
     assert subject_data == expected_out
 
+    # the record view regroups the lists per preproc
+    records = list(subject_data_records(subject_data))
+    assert records == [{'brainmask': str(brainmask_file),
+                        'confounds': str(confounds_file),
+                        'events': str(sub_events),
+                        'preproc': str(preproc_file),
+                        'metadata': metadata}]
+
+
+def test_collect_data_bulk(bids_layout, sub_metadata, preproc_file,
+                           sub_events, confounds_file, brainmask_file):
+
+    with open(str(sub_metadata), "r") as sm:
+        metadata = json.load(sm)
+
+    expected_out = {
+            'brainmask': [str(brainmask_file)],
+            'confounds': [str(confounds_file)],
+            'events': [str(sub_events)],
+            'preproc': [str(preproc_file)],
+            'metadata': [metadata]
+        }
+
+    bulk_data = collect_data_bulk(bids_layout, ['01'], ses='pre',
+                                  task='waffles', run='1',
+                                  space='MNI152NLin2009cAsym',
+                                  description='preproc')
+
+    assert bulk_data['01'] == expected_out
+
+
+def test_collect_data_bulk_missing_subject(bids_layout):
+    with pytest.raises(ValueError) as val_err:
+        collect_data_bulk(bids_layout, ['01', '03'], ses='pre',
+                          task='waffles', run='1',
+                          space='MNI152NLin2009cAsym',
+                          description='preproc')
+
+    assert "could not find preprocessed outputs:" in str(val_err.value)
+
+
+def test_cached_collect_data_bulk(bids_layout, sub_metadata, preproc_file,
+                                  sub_events, confounds_file, brainmask_file,
+                                  tmp_path):
+    cache_dir = str(tmp_path / 'collect_data_cache')
+    query = dict(ses='pre', task='waffles', run='1',
+                 space='MNI152NLin2009cAsym', description='preproc')
+
+    first = cached_collect_data_bulk(bids_layout, ['01'], cache_dir=cache_dir,
+                                     database_mtime=1.0, **query)
+
+    # the second call must be served from disk: no layout is provided
+    second = cached_collect_data_bulk(None, ['01'], cache_dir=cache_dir,
+                                      database_mtime=1.0, **query)
+
+    assert first == second
+
+
+def test_bids2table_layout_get():
+    frame = pd.DataFrame({
+        'subject': ['01', '01', '02'],
+        'session': ['pre', 'pre', None],
+        'task': ['waffles', 'waffles', 'waffles'],
+        'run': ['1', '1', '1'],
+        'space': ['MNI152NLin2009cAsym', None, None],
+        'desc': ['preproc', None, None],
+        'suffix': ['bold', 'bold', 'bold'],
+        'extension': ['nii.gz', 'nii.gz', 'nii'],
+        'datatype': ['func', 'func', 'func'],
+        'scope': ['derivatives', 'raw', 'raw'],
+        'path': ['/deriv/sub-01_preproc_bold.nii.gz',
+                 '/bids/sub-01_bold.nii.gz',
+                 '/bids/sub-02_bold.nii'],
+        'metadata': [{}, {'RepetitionTime': 2}, {}],
+    })
+    layout = BIDS2TableLayout(frame)
+
+    preprocs = layout.get(subject='01', suffix='bold',
+                          extension=['nii', 'nii.gz'], scope='derivatives')
+    assert len(preprocs) == 1
+    assert preprocs[0].path == '/deriv/sub-01_preproc_bold.nii.gz'
+    assert preprocs[0].task == 'waffles'
+    assert getattr(preprocs[0], 'acquisition', None) is None
+
+    # desc=None means the desc entity must be absent
+    raw_bolds = layout.get(subject='01', suffix='bold', desc=None,
+                           extension=['nii', 'nii.gz'])
+    assert len(raw_bolds) == 1
+    assert raw_bolds[0].get_metadata() == {'RepetitionTime': 2}
+
+    # run entities are compared as strings regardless of input type,
+    # including the floats a partially-missing column is read back as
+    assert len(layout.get(subject='02', run=1)) == 1
+    assert len(layout.get(subject='02', run=1.0)) == 1
+    assert BIDS2TableLayout._norm('run', 1.0) == '1'
+
+    with pytest.raises(ValueError) as val_err:
+        layout.get(subject='01', nonentity='nope')
+    assert "unsupported query entity" in str(val_err.value)
+
 
 @pytest.mark.parametrize(
     "sub,session,task,run,space,desc",
@@ -7,12 +7,136 @@ Workflow for getting subject info
 presumes fmriprep has run, expects directories to exist for
 both BIDS data and fmriprep output
 '''
+import hashlib
+import json
+import os
+
+
+class BIDS2TableFile(object):
+    """
+    Minimal stand-in for a pybids ``BIDSFile``, exposing the path,
+    entity attributes, and metadata used by :func:`collect_data`
+    """
+
+    def __init__(self, path, entities, metadata=None):
+        self.path = path
+        self._entities = entities
+        self._metadata = metadata if metadata is not None else {}
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['_entities'][name]
+        except KeyError:
+            raise AttributeError(
+                "{file} has no entity {name}".format(file=self.path, name=name))
+
+    def get_metadata(self):
+        return self._metadata
+
+    def __repr__(self):
+        return "<BIDS2TableFile filename='{path}'>".format(path=self.path)
+
+
+class BIDS2TableLayout(object):
+    """
+    Thin adapter around a bids2table index exposing the subset of the
+    ``BIDSLayout.get`` API used by :func:`collect_data`
+    """
+
+    # the only entities collect_data filters on
+    _entity_columns = ('subject', 'session', 'task', 'run', 'space', 'desc',
+                       'suffix', 'extension', 'datatype', 'scope')
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    @classmethod
+    def from_bids2table(cls, table, derivatives_dir=None):
+        """normalize a ``bids2table.BIDSTable`` into a flat dataframe"""
+        import pandas as pd
+
+        entities = table.ent
+        frame = pd.DataFrame({
+            'subject': entities.get('sub'),
+            'session': entities.get('ses'),
+            'task': entities.get('task'),
+            'run': entities.get('run'),
+            'space': entities.get('space'),
+            'desc': entities.get('desc'),
+            'suffix': entities.get('suffix'),
+            'extension': entities.get('ext'),
+            'datatype': entities.get('datatype'),
+            'path': table.finfo['file_path'],
+        })
+
+        # entity values are compared as (normalized) strings
+        for column in cls._entity_columns:
+            if column in frame:
+                frame[column] = frame[column].map(
+                    lambda v: cls._norm(column, v), na_action='ignore')
+
+        if derivatives_dir:
+            deriv_prefix = os.path.abspath(derivatives_dir) + os.sep
+            in_derivatives = frame['path'].map(
+                lambda p: os.path.abspath(p).startswith(deriv_prefix))
+            frame['scope'] = in_derivatives.map(
+                {True: 'derivatives', False: 'raw'})
+        else:
+            frame['scope'] = 'raw'
+
+        frame['metadata'] = [
+            {key: value for key, value in record.items()
+             if not (isinstance(value, float) and pd.isna(value))}
+            for record in table.flat_meta.to_dict('records')]
+
+        return cls(frame)
+
+    @staticmethod
+    def _norm(entity, value):
+        """normalize an entity value for comparison"""
+        if isinstance(value, float) and value.is_integer():
+            # entity columns with any missing value are read back as
+            # floats, so a run of 1 would otherwise stringify to '1.0'
+            value = int(value)
+        value = str(value)
+        if entity == 'extension':
+            value = value.lstrip('.')
+        return value
+
+    def get(self, **filters):
+        """query the index, mirroring ``BIDSLayout.get`` semantics"""
+        import pandas as pd
+
+        mask = pd.Series(True, index=self.frame.index)
+        for entity, value in filters.items():
+            if entity not in self._entity_columns:
+                raise ValueError(
+                    "unsupported query entity: {entity}".format(entity=entity))
+            if entity == 'scope' and value == 'all':
+                continue
+            column = self.frame[entity]
+            if value is None:
+                # None means the entity must be absent from the filename
+                mask &= column.isna()
+            elif isinstance(value, (list, tuple)):
+                mask &= column.isin([self._norm(entity, v) for v in value])
+            else:
+                mask &= column == self._norm(entity, value)
+
+        hits = self.frame[mask]
+        return [BIDS2TableFile(
+                    record['path'],
+                    {entity: record[entity] for entity in self._entity_columns
+                     if not pd.isna(record[entity])},
+                    metadata=record['metadata'])
+                for record in hits.to_dict('records')]
 
 
 def collect_data(layout, participant_label, ses=None,
                  task=None, run=None, space=None, description=None):
     """
-    Uses pybids to retrieve the input data for a given participant
+    Uses pybids to retrieve the input data for a given participant,
+    returned as a dict of lists keyed by modality (one entry per preproc)
     """
     # get all the preprocessed fmri images.
     preproc_query = {
@@ -83,7 +207,209 @@ def collect_data(layout, participant_label, ses=None,
         query_res['metadata'] = bold_file.get_metadata()
         preproc_collector.append(query_res)
 
-    return preproc_collector
+    return _columns_from_records(preproc_collector)
+
+
+def collect_data_bulk(layout, subject_list, ses=None,
+                      task=None, run=None, space=None, description=None):
+    """
+    Bulk variant of :func:`collect_data`: issues one layout query per
+    suffix for the whole subject list and groups the results in Python,
+    turning O(subjects x entities) query round-trips into a handful.
+    Returns a dict mapping each subject label to the same dict of lists
+    :func:`collect_data` would return for it.
+    """
+    # get all the preprocessed fmri images across the whole subject list
+    preproc_query = {
+        'subject': subject_list,
+        'datatype': 'func',
+        'suffix': 'bold',
+        'extension': ['nii', 'nii.gz'],
+        'scope': 'derivatives',
+    }
+
+    if task:
+        preproc_query['task'] = task
+    if run:
+        preproc_query['run'] = run
+    if ses:
+        preproc_query['session'] = ses
+    if space:
+        preproc_query['space'] = space
+    if description:
+        preproc_query['desc'] = description
+
+    preprocs = layout.get(**preproc_query)
+
+    # one query per supporting suffix, indexed by entity tuple for O(1)
+    # lookups while walking the preprocs
+    space_entities = ('subject', 'session', 'task', 'run', 'space')
+    nospace_entities = ('subject', 'session', 'task', 'run')
+
+    brainmask_lookup = _index_by_entities(
+        layout.get(subject=subject_list, datatype='func', suffix='mask',
+                   desc='brain', extension=['nii', 'nii.gz']),
+        space_entities)
+    confounds_lookup = _index_by_entities(
+        layout.get(subject=subject_list, datatype='func', suffix='regressors',
+                   desc='confounds', extension='.tsv'),
+        nospace_entities)
+    events_lookup = _index_by_entities(
+        layout.get(subject=subject_list, datatype='func', suffix='events',
+                   extension='.tsv'),
+        nospace_entities)
+    bold_lookup = _index_by_entities(
+        layout.get(subject=subject_list, datatype='func', suffix='bold',
+                   desc=None, extension=['nii', 'nii.gz']),
+        nospace_entities)
+
+    bulk_data = {str(subject_label): [] for subject_label in subject_list}
+    subjects_with_preprocs = set()
+    for preproc in preprocs:
+        subject_label = _norm_entity(getattr(preproc, 'subject', None))
+        subjects_with_preprocs.add(subject_label)
+
+        preproc_dict = {'datatype': 'func', 'subject': subject_label}
+        preproc_dict['task'] = getattr(preproc, 'task', None)
+        preproc_dict['run'] = getattr(preproc, 'run', None)
+        preproc_dict['session'] = getattr(preproc, 'session', None)
+        preproc_dict['space'] = getattr(preproc, 'space', None)
+
+        if preproc_dict['task'] == 'rest':
+            print('Found resting state bold run, skipping')
+            continue
+
+        # event files and confounds are the same regardless of space
+        preproc_dict_ns = {k: v for k, v in preproc_dict.items() if k != 'space'}
+
+        # the per-file queries collect_data would have issued, kept for
+        # error reporting when a lookup comes up empty
+        file_queries = {
+            'brainmask': _combine_dict(preproc_dict, {'suffix': 'mask',
+                                                      'desc': 'brain',
+                                                      'extension': ['nii', 'nii.gz']}),
+            'confounds': _combine_dict(preproc_dict_ns, {'suffix': 'regressors',
+                                                         'desc': 'confounds',
+                                                         'extension': '.tsv'}),
+            'events': _combine_dict(preproc_dict_ns, {'suffix': 'events',
+                                                      'extension': '.tsv'}),
+        }
+
+        key = _entity_key(preproc, space_entities)
+        key_ns = _entity_key(preproc, nospace_entities)
+        lookups = {
+            'brainmask': (brainmask_lookup, key),
+            'confounds': (confounds_lookup, key_ns),
+            'events': (events_lookup, key_ns),
+        }
+
+        query_res = {}
+        for modality, (lookup, lookup_key) in lookups.items():
+            match = lookup.get(lookup_key)
+            if match is None:
+                msg = "could not find file matching these criteria: {q}".format(
+                    q=file_queries[modality])
+                raise Exception(msg)
+            query_res[modality] = match.path
+
+        # add the preprocessed file
+        query_res['preproc'] = preproc.path
+
+        # get metadata for the preproc
+        bold_file = bold_lookup.get(key_ns)
+        if bold_file is None:
+            bold_query = _combine_dict(preproc_dict_ns, {'suffix': 'bold',
+                                                         'extension': ['nii', 'nii.gz'],
+                                                         'desc': None})
+            msg = "could not find file matching these criteria: {q}".format(q=bold_query)
+            raise Exception(msg)
+
+        query_res['metadata'] = bold_file.get_metadata()
+        bulk_data.setdefault(subject_label, []).append(query_res)
+
+    for subject_label in subject_list:
+        if str(subject_label) not in subjects_with_preprocs:
+            subject_query = _combine_dict(preproc_query, {'subject': subject_label})
+            msg = "could not find preprocessed outputs: " + str(subject_query)
+            raise ValueError(msg)
+
+    return {subject_label: _columns_from_records(records)
+            for subject_label, records in bulk_data.items()}
+
+
+def cached_collect_data_bulk(layout, subject_list, cache_dir=None,
+                             database_mtime=None, ses=None, task=None,
+                             run=None, space=None, description=None):
+    """
+    Disk-cached wrapper around :func:`collect_data_bulk`, keyed by the
+    query arguments plus the layout database mtime. On workflow resumes
+    a cache hit replaces the layout queries with a single json read.
+    Passing ``cache_dir=None`` disables caching.
+    """
+    if cache_dir is None:
+        return collect_data_bulk(layout, subject_list, ses=ses, task=task,
+                                 run=run, space=space, description=description)
+
+    key_src = json.dumps({'subjects': [str(label) for label in subject_list],
+                          'ses': ses,
+                          'task': task,
+                          'run': run,
+                          'space': space,
+                          'description': description,
+                          'database_mtime': database_mtime},
+                         sort_keys=True)
+    cache_file = os.path.join(
+        cache_dir, hashlib.sha1(key_src.encode('utf-8')).hexdigest() + '.json')
+
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'r') as cached:
+                return json.load(cached)
+        except ValueError:
+            # a truncated cache file (interrupted write) is a cache miss
+            pass
+
+    bulk_data = collect_data_bulk(layout, subject_list, ses=ses, task=task,
+                                  run=run, space=space, description=description)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(cache_file, 'w') as cached:
+        json.dump(bulk_data, cached)
+
+    return bulk_data
+
+
+# modalities collected per preproc, in the order records are assembled
+_COLLECT_KEYS = ('brainmask', 'confounds', 'events', 'preproc', 'metadata')
+
+
+def _columns_from_records(records):
+    """list of per-preproc dicts -> one dict of lists (AoS -> SoA)"""
+    return {key: [record[key] for record in records] for key in _COLLECT_KEYS}
+
+
+def subject_data_records(subject_data):
+    """lazily iterate the per-preproc (record) view of a dict of lists"""
+    for values in zip(*(subject_data[key] for key in _COLLECT_KEYS)):
+        yield dict(zip(_COLLECT_KEYS, values))
+
+
+def _norm_entity(value):
+    """entity values are compared as strings (pybids returns ints for run)"""
+    return str(value) if value is not None else None
+
+
+def _entity_key(bids_file, entities):
+    return tuple(_norm_entity(getattr(bids_file, entity, None))
+                 for entity in entities)
+
+
+def _index_by_entities(bids_files, entities):
+    """index files by entity tuple, keeping the first hit like ``get(...)[0]``"""
+    lookup = {}
+    for bids_file in bids_files:
+        lookup.setdefault(_entity_key(bids_file, entities), bids_file)
+    return lookup
 
 
 def _combine_dict(a, b):